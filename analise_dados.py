@@ -4,11 +4,15 @@ Sistema de Análise de Dados - Indústria Têxtil
 Conecta ao MySQL, analisa dados e gera relatório Excel formatado
 """
 import pandas as pd
+import openpyxl
 from sqlalchemy import create_engine
 from sqlalchemy.exc import SQLAlchemyError
 import sys
+import os
+import glob
+import json
+import hashlib
 from datetime import datetime
-from openpyxl import load_workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.chart import PieChart, Reference
@@ -23,13 +27,28 @@ except ImportError:
     sys.exit(1)
 
 
+def _versao_relatorio():
+    """Deriva a versão do relatório do código-fonte e das bibliotecas de exportação"""
+    h = hashlib.sha256()
+    with open(__file__, 'rb') as f:
+        h.update(f.read())
+    h.update(f'{pd.__version__}|{openpyxl.__version__}'.encode())
+    return h.hexdigest()[:16]
+
+
 class AnaliseDadosTextil:
     """Classe principal para análise de dados da indústria têxtil"""
     
+    ABA_DASHBOARD = '📊 Dashboard'
+    # Qualquer mudança neste arquivo (consultas, layout, formatação, gráficos)
+    # ou nas versões de pandas/openpyxl invalida os relatórios reaproveitados
+    VERSAO_RELATORIO = _versao_relatorio()
+    
     def __init__(self):
         self.engine = None
         self.dados = {}
         self.excel_filename = None
+        self.alteracoes = {}
         
     def conectar_mysql(self):
         """Conecta ao MySQL usando SQLAlchemy"""
@@ -205,33 +224,136 @@ class AnaliseDadosTextil:
         print(f"✅ {len(self.dados)} conjuntos de dados extraídos!")
     
     def gerar_relatorio_local(self):
-        """Gera relatório Excel local completo com formatação"""
+        """Gera relatório Excel local completo, reaproveitando o anterior se nada mudou"""
         print("\n💾 Gerando relatório Excel formatado...")
         
+        # Montar conteúdo de cada aba (Dashboard primeiro)
+        abas = {}
+        blocos_dashboard = self._montar_dashboard()
+        if blocos_dashboard is not None:
+            abas[self.ABA_DASHBOARD] = blocos_dashboard
+        for nome, df in self.dados.items():
+            if not df.empty:
+                sheet_name = nome.replace('_', ' ').title()[:31]
+                titulo_df = pd.DataFrame([[f'📊 {sheet_name}']], columns=[''])
+                abas[sheet_name] = [(titulo_df, 0, 0, False), (df, 2, 0, True)]
+        
+        # Comparar hashes com o relatório anterior
+        hashes = {aba: self._calcular_hash(blocos) for aba, blocos in abas.items()}
+        anterior = self._localizar_relatorio_anterior()
+        registro = self._ler_registro(anterior) if anterior else None
+        hashes_anteriores = registro['abas'] if registro else {}
+        
+        alteradas = [aba for aba in abas if hashes_anteriores.get(aba) != hashes[aba]]
+        inalteradas = [aba for aba in abas if aba not in alteradas]
+        removidas = [aba for aba in hashes_anteriores if aba not in abas]
+        self.alteracoes = {
+            'alteradas': alteradas,
+            'inalteradas': inalteradas,
+            'removidas': removidas,
+            'reaproveitado': bool(registro) and not alteradas and not removidas,
+        }
+        self._exibir_resumo_alteracoes()
+        
+        # Sem alterações: o relatório anterior (íntegro) já é o resultado
+        if self.alteracoes['reaproveitado']:
+            self.excel_filename = anterior
+            print(f"✅ Nenhuma alteração, relatório reaproveitado: {self.excel_filename}")
+            return self.excel_filename
+        
         self.excel_filename = f'relatorio_textil_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
         
-        # Criar Excel com pandas
         with pd.ExcelWriter(self.excel_filename, engine='openpyxl') as writer:
-            # Dashboard primeiro
-            self._criar_dashboard_excel(writer)
-            
-            # Exportar cada dataset
-            for nome, df in self.dados.items():
-                if not df.empty:
-                    sheet_name = nome.replace('_', ' ').title()[:31]
-
-                    titulo_df = pd.DataFrame([[f'📊 {sheet_name}']], columns=[''])
-                    titulo_df.to_excel(writer, sheet_name=sheet_name, index=False, header=False, startrow=0)
-                    df.to_excel(writer, sheet_name=sheet_name, index=False, startrow=2)
+            for aba, blocos in abas.items():
+                for df, startrow, startcol, header in blocos:
+                    df.to_excel(writer, sheet_name=aba, index=False, header=header,
+                                startrow=startrow, startcol=startcol)
+            
+            # Formatar no próprio workbook do writer, sem recarregar o arquivo salvo
+            self._formatar_excel(writer.book, list(abas))
+            self._carimbar_data_dashboard(writer.book)
         
-        # Aplicar formatação
-        self._formatar_excel()
+        self._gravar_registro(self.excel_filename, hashes)
         
         print(f"✅ Relatório Excel salvo: {self.excel_filename}")
         return self.excel_filename
     
-    def _criar_dashboard_excel(self, writer):
-        """Cria aba de dashboard no Excel com tops e gráficos"""
+    def _calcular_hash(self, blocos):
+        """Calcula hash do conteúdo de uma aba a partir de seus blocos de dados"""
+        h = hashlib.sha256(self.VERSAO_RELATORIO.encode())
+        for df, startrow, startcol, header in blocos:
+            h.update(repr((startrow, startcol, header, list(df.columns),
+                           [str(t) for t in df.dtypes])).encode())
+            h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        return h.hexdigest()
+    
+    def _carimbar_data_dashboard(self, wb):
+        """Preenche a data de geração no dashboard (mantida fora do hash da aba)"""
+        if self.ABA_DASHBOARD in wb.sheetnames:
+            wb[self.ABA_DASHBOARD]['A2'] = f'Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M:%S")}'
+    
+    @staticmethod
+    def _hash_arquivo(arquivo):
+        """Calcula hash SHA-256 do conteúdo de um arquivo"""
+        h = hashlib.sha256()
+        with open(arquivo, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloco)
+        return h.hexdigest()
+    
+    @staticmethod
+    def _caminho_registro(arquivo):
+        """Retorna o caminho do arquivo de hashes que acompanha um relatório"""
+        return f'{os.path.splitext(arquivo)[0]}.hashes.json'
+    
+    def _localizar_relatorio_anterior(self):
+        """Retorna o relatório mais recente da pasta, se existir"""
+        relatorios = sorted(glob.glob('relatorio_textil_*.xlsx'))
+        return relatorios[-1] if relatorios else None
+    
+    def _ler_registro(self, arquivo):
+        """Lê os hashes de um relatório anterior, validando que o arquivo não foi alterado"""
+        caminho = self._caminho_registro(arquivo)
+        if not os.path.exists(caminho):
+            return None
+        try:
+            with open(caminho, encoding='utf-8') as f:
+                registro = json.load(f)
+            if registro.get('versao') != self.VERSAO_RELATORIO:
+                return None
+            # Abas apagadas/renomeadas ou edições manuais mudam o hash do arquivo
+            if registro.get('arquivo') != self._hash_arquivo(arquivo):
+                print(f"    ⚠️  {arquivo} foi modificado após ser gerado, ignorando")
+                return None
+            return registro
+        except Exception as e:
+            print(f"    ⚠️  Erro ao ler relatório anterior: {e}")
+            return None
+    
+    def _gravar_registro(self, arquivo, hashes):
+        """Grava os hashes das abas e do arquivo ao lado do relatório"""
+        registro = {
+            'versao': self.VERSAO_RELATORIO,
+            'arquivo': self._hash_arquivo(arquivo),
+            'abas': hashes,
+        }
+        with open(self._caminho_registro(arquivo), 'w', encoding='utf-8') as f:
+            json.dump(registro, f, ensure_ascii=False, indent=2)
+    
+    def _exibir_resumo_alteracoes(self):
+        """Exibe resumo das abas alteradas, inalteradas e removidas"""
+        print("  → Resumo de alterações:")
+        rotulos = {
+            'alteradas': '✏️  Alteradas',
+            'inalteradas': '✔️  Inalteradas',
+            'removidas': '🗑️  Removidas',
+        }
+        for chave, rotulo in rotulos.items():
+            abas = self.alteracoes[chave]
+            print(f"     {rotulo} ({len(abas)}): {', '.join(abas) if abas else '-'}")
+    
+    def _montar_dashboard(self):
+        """Monta os blocos da aba de dashboard com tops e dados dos gráficos"""
         try:
             # Buscar dados para resumo geral
             totais = {
@@ -296,7 +418,7 @@ class AnaliseDadosTextil:
             
             dashboard_data = {
                 'Indicador': [
-                    f'Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M:%S")}',
+                    '',  # "Gerado em" preenchido em _carimbar_data_dashboard (fora do hash)
                     '',
                     '📈 RESUMO GERAL',
                     '',
@@ -330,7 +452,7 @@ class AnaliseDadosTextil:
             }
             
             df_dashboard = pd.DataFrame(dashboard_data)
-            df_dashboard.to_excel(writer, sheet_name='📊 Dashboard', index=False, startrow=0)
+            blocos = [(df_dashboard, 0, 0, True)]
             
             top_clientes_data = {
                 'Indicador': ['', '🏆 TOP 3 CLIENTES', ''] + 
@@ -339,7 +461,7 @@ class AnaliseDadosTextil:
                          [f"R$ {row['valor_total']:,.2f}" for _, row in top_clientes.iterrows()]
             }
             df_top_clientes = pd.DataFrame(top_clientes_data)
-            df_top_clientes.to_excel(writer, sheet_name='📊 Dashboard', index=False, startrow=0, startcol=4)
+            blocos.append((df_top_clientes, 0, 4, True))
             
             top_pag_data = {
                 'Indicador': ['', '💳 TOP 3 FORMAS PAGAMENTO', ''] + 
@@ -350,7 +472,7 @@ class AnaliseDadosTextil:
                          [f"R$ {row['valor_total']:,.2f}" for _, row in top_pagamentos.iterrows()]
             }
             df_top_pag = pd.DataFrame(top_pag_data)
-            df_top_pag.to_excel(writer, sheet_name='📊 Dashboard', index=False, startrow=0, startcol=7)
+            blocos.append((df_top_pag, 0, 7, True))
             
             manutencao_data = {
                 'Indicador': [
@@ -369,7 +491,7 @@ class AnaliseDadosTextil:
                 ]
             }
             df_manutencao = pd.DataFrame(manutencao_data)
-            df_manutencao.to_excel(writer, sheet_name='📊 Dashboard', index=False, startrow=9, startcol=4)
+            blocos.append((df_manutencao, 9, 4, True))
             
             top_turnos_data = {
                 'Indicador': ['', '🕐 TOP 3 TURNOS', ''] + 
@@ -378,7 +500,7 @@ class AnaliseDadosTextil:
                          [f"{int(row['total_produzido']):,} unidades" for _, row in top_turnos.iterrows()]
             }
             df_top_turnos = pd.DataFrame(top_turnos_data)
-            df_top_turnos.to_excel(writer, sheet_name='📊 Dashboard', index=False, startrow=0, startcol=11)
+            blocos.append((df_top_turnos, 0, 11, True))
             
 
             top5_clientes = pd.read_sql("""
@@ -424,32 +546,30 @@ class AnaliseDadosTextil:
                 'Cliente': top5_clientes['nome'],
                 'Valor Total (R$)': top5_clientes['valor_total']
             })
-            df_grafico_clientes.to_excel(writer, sheet_name='📊 Dashboard', index=False, 
-                                        startrow=start_row, startcol=0)
+            blocos.append((df_grafico_clientes, start_row, 0, True))
             
             df_grafico_pag = pd.DataFrame({
                 'Forma de Pagamento': top5_pagamentos['forma_pagamento'],
                 'Valor Total (R$)': top5_pagamentos['valor_total']
             })
-            df_grafico_pag.to_excel(writer, sheet_name='📊 Dashboard', index=False, 
-                                   startrow=start_row, startcol=4)
+            blocos.append((df_grafico_pag, start_row, 4, True))
             
             df_grafico_turnos = pd.DataFrame({
                 'Turno': top3_turnos['turno'],
                 'Total Produzido (unidades)': top3_turnos['total_produzido']
             })
-            df_grafico_turnos.to_excel(writer, sheet_name='📊 Dashboard', index=False, 
-                                      startrow=start_row, startcol=8)
+            blocos.append((df_grafico_turnos, start_row, 8, True))
+            
+            return blocos
             
         except Exception as e:
             print(f"    ⚠️  Erro ao criar dashboard: {e}")
+            return None
     
-    def _formatar_excel(self):
-        """Aplica formatação ao Excel"""
+    def _formatar_excel(self, wb, abas):
+        """Aplica formatação às abas informadas do Excel"""
         print("  → Aplicando formatação...")
         
-        wb = load_workbook(self.excel_filename)
-        
         cor_header = PatternFill(start_color="00B2A4", end_color="00B2A4", fill_type="solid")
         cor_titulo = PatternFill(start_color="E8E8E8", end_color="E8E8E8", fill_type="solid")
         cor_secao = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
@@ -467,16 +587,15 @@ class AnaliseDadosTextil:
             bottom=Side(style='thin')
         )
         
-        for sheet_name in wb.sheetnames:
+        for sheet_name in abas:
             ws = wb[sheet_name]
             
-            if sheet_name == '📊 Dashboard':
+            if sheet_name == self.ABA_DASHBOARD:
                 self._formatar_dashboard(ws, font_secao, align_left, cor_secao)
             else:
                 self._formatar_aba_dados(ws, font_header, cor_titulo, cor_header, 
                                         align_center, border_thin)
         
-        wb.save(self.excel_filename)
         print("  → Formatação aplicada!")
     
     def _formatar_dashboard(self, ws, font_secao, align_left, cor_secao):
@@ -643,7 +762,10 @@ class AnaliseDadosTextil:
         if self.engine:
             self.engine.dispose()
             print("\n✅ Análise concluída com sucesso!")
-            print(f"   📊 Excel gerado: {excel_file}")
+            if self.alteracoes.get('reaproveitado'):
+                print(f"   📊 Excel reaproveitado (sem alterações desde a última execução): {excel_file}")
+            else:
+                print(f"   📊 Excel gerado: {excel_file}")
             print("\n💡 Dica: Para enviar ao Google Sheets, faça upload manual em:")
             print("      https://drive.google.com/")
         